@@ -0,0 +1,104 @@
+"""
+MongoDB/AWS DocumentDBへの非同期アクセス(motor)
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from logging import Logger, getLogger, NullHandler
+from typing import Any, Mapping, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+
+from Fundamental import DBError, split_sequence
+from MongoDb import MongoDBConfig, BULK_WRITE_BATCH_SIZE, identity
+
+logger: Logger = getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+class AsyncMongoDB:
+    """
+    MongoDB/DocumentDBアクセスの非同期ラッパクラス。
+
+    同期版MongoDBと同じコネクションプール上で、独立な書き込みを
+    asyncio.gatherにより同時に飛ばしてRTTを重ね合わせる。
+    bulk_writeが使える場面ではそちらを優先する。
+
+    Attributes:
+        __client (motor.motor_asyncio.AsyncIOMotorClient): MongoDBのデータベース
+        __collection (motor.motor_asyncio.AsyncIOMotorCollection): MongoDBのデータベース内コレクション
+    """
+    def __init__(self, config: MongoDBConfig):
+        """
+        DB設定を読み込み、DBへの接続準備をする。
+
+        Args:
+            config(MongoDBConfig): DB設定
+        """
+        try:
+            self.__client = AsyncIOMotorClient(config.uri, **config.pymongo_option_dict)
+            self.__collection = self.__client[config.database].get_collection(config.collection)
+        except ServerSelectionTimeoutError as e:
+            raise DBError(e.args)
+
+    def close(self) -> None:
+        """
+        DB接続（コネクションプール）を閉じる。
+        """
+        self.__client.close()
+
+    async def __aenter__(self) -> AsyncMongoDB:
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    async def upsert_stations(self, documents: Sequence[Mapping[str, Any]]) -> None:
+        """
+        コレクションに観測所ごとのデータドキュメント列をupsertで登録。
+        異なるドキュメントへの更新は独立なので、asyncio.gatherで同時に発行してRTTを重ね合わせる。
+        同一ドキュメント内の観測所は順に適用する。同じ"_id"へのupsertを同時に飛ばすと、
+        ドキュメント未存在時に挿入が競合して重複キーエラーになるため。
+        （順序制約などでbulk_writeが使えない場合のための並行版。）
+
+        Args:
+            documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
+        """
+        try:
+            set_on_insert: Mapping[str, Any] = {"createTime": datetime.now(timezone.utc)}
+
+            async def upsert_document_stations(document: Mapping[str, Any]) -> None:
+                for station_id, station_data in document["data"].items():
+                    await self.__collection.update_one(
+                        identity(document),
+                        {r"$set": {f"data.{station_id}": station_data},
+                         r"$setOnInsert": set_on_insert},
+                        upsert=True)
+
+            await asyncio.gather(*(upsert_document_stations(document) for document in documents))
+        except OperationFailure as e:
+            raise DBError(e.args)
+
+    async def upsert_all(self, documents: Sequence[Mapping[str, Any]]) -> None:
+        """
+        upsert。順序制約がないのでbulk_writeでバッチ実行する。
+
+        Args:
+            documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
+        """
+        try:
+            set_on_insert: Mapping[str, Any] = {"createTime": datetime.now(timezone.utc)}
+            operations: Sequence[UpdateOne] = [
+                UpdateOne(
+                    identity(document),
+                    {r"$set": document,
+                     r"$setOnInsert": set_on_insert},
+                    upsert=True)
+                for document in documents]
+            for operation_batch in split_sequence(operations, BULK_WRITE_BATCH_SIZE):
+                await self.__collection.bulk_write(list(operation_batch), ordered=False)
+        except OperationFailure as e:
+            raise DBError(e.args)
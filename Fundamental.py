@@ -3,20 +3,26 @@ Fundamentalモジュール: 基本ユーティリティ
 """
 from __future__ import annotations
 
+import atexit
 import os
+import queue
+import re
 from datetime import timezone, timedelta
-from itertools import chain
+from itertools import chain, islice
 from logging import Logger, getLogger, NullHandler, FileHandler, DEBUG, INFO, StreamHandler, WARNING, Formatter, \
     basicConfig
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from pathlib import Path
-from typing import Mapping, Final, Iterable, Sequence, Generator, TypeVar, Any
+from typing import Mapping, MutableMapping, Final, Iterable, Sequence, Set, Generator, TypeVar, Any, Optional
 
 logger: Logger = getLogger(__name__)
 logger.addHandler(NullHandler())
 
 T = TypeVar("T")
 JST: timezone = timezone(timedelta(hours=+9), 'JST')
+_FLOAT_RE: Final[re.Pattern] = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')  # 通常の数値文字列の高速判定
+_log_listener: Optional[QueueListener] = None  # set_loggingが起動したログ書き込みスレッド
+_created_directories: Set[Path] = set()  # prepare_output_directoryが作成済みのディレクトリ
 
 
 class Error(Exception):
@@ -85,14 +91,15 @@ def prepare_output_directory(
         output_directory(pathlib.Path): ディレクトリパス
         warning(bool): 生成時にメッセージを表示するかどうか
     """
-    if not output_directory.is_dir():
-        if warning:
-            logger.info(f"The specified output directory {output_directory} does not exist."
-                        f"Making the directory.")
-        try:
-            output_directory.mkdir(parents=True, exist_ok=True)
-        except FileExistsError as e:
-            raise DataWriteError(e.args)
+    if output_directory in _created_directories:
+        return
+    if warning:
+        logger.info("Making the output directory %s unless it exists.", output_directory)
+    try:
+        output_directory.mkdir(parents=True, exist_ok=True)
+    except FileExistsError as e:
+        raise DataWriteError(e.args)
+    _created_directories.add(output_directory)
 
 
 def adjust_data_value(data_value: str, disabled_value_str=None) -> str:
@@ -127,8 +134,9 @@ def is_convertible_to_float(string: str) -> bool:
     Returns:
         変換可能ならTrue
     """
-    # return string.strip().replace(',', '').replace('.', '').replace('-', '').isnumeric()
-    try:
+    if _FLOAT_RE.match(string) is not None:
+        return True
+    try:  # "inf"や"nan"、空白付きなど正規表現で判定しない形式のみfloat()で判定
         float(string)
     except ValueError:
         return False
@@ -158,10 +166,18 @@ def set_logging(log_file: Path, max_bytes=100000, backup_count=5) -> None:
     stream_handler.setLevel(WARNING)
     stream_handler.setFormatter(Formatter(formatting))
 
+    # 呼び出しスレッドはキューに積むだけにし、ファイル/ストリームへの書き込みは
+    # QueueListenerのバックグラウンドスレッドに任せる
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    global _log_listener
+    _log_listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
     # noinspection PyArgumentList
     basicConfig(
         level=DEBUG,
-        handlers=[file_handler, stream_handler])
+        handlers=[QueueHandler(log_queue)])
 
 
 def merge_mappings(dictionaries: Iterable[Mapping]) -> Mapping:
@@ -173,20 +189,29 @@ def merge_mappings(dictionaries: Iterable[Mapping]) -> Mapping:
     Returns:
         マージした辞書(Mapping)
     """
-    return {key: value for dictionary in dictionaries for key, value in dictionary.items()}
+    merged: MutableMapping = dict()
+    for dictionary in dictionaries:
+        merged.update(dictionary)
+    return merged
 
 
-def split_sequence(sequence: Sequence, sublist_size: int) -> Generator[Sequence, Any, None]:
+def split_sequence(sequence: Iterable, sublist_size: int) -> Generator[Sequence, Any, None]:
     """
-    Sequenceをsub-sequencesに分割する
+    Iterableをsub-sequencesに分割する。
+    list/tupleはスライスで、その他のIterable（ジェネレータ等）はisliceでストリーミング分割する。
     Args:
-        sequence(Sequence): リスト
+        sequence(Iterable): 分割したいIterable
         sublist_size(int): サブリストの要素数
     Returns:
         サブリストのGenerator
     """
-    for index in range(0, len(sequence), sublist_size):
-        yield sequence[index:index + sublist_size]
+    if isinstance(sequence, (list, tuple)):
+        for index in range(0, len(sequence), sublist_size):
+            yield sequence[index:index + sublist_size]
+        return
+    iterator = iter(sequence)
+    while chunk := list(islice(iterator, sublist_size)):
+        yield chunk
 
 
 def split_sequence_eager(sequence: Sequence, sublist_size: int) -> Sequence[Sequence]:
@@ -222,7 +247,7 @@ def transpose_eager(matrix: Iterable[Iterable[T]]) -> Sequence[Sequence[T]]:
     Returns:
         転置行列(Sequence[Sequence[T]])
     """
-    return list(list(column for column in row) for row in transpose(matrix))
+    return [list(row) for row in transpose(matrix)]
 
 
 def flatten(matrix: Iterable[Iterable[T]]) -> Iterable[T]:
@@ -236,7 +261,7 @@ def flatten(matrix: Iterable[Iterable[T]]) -> Iterable[T]:
     Returns:
         平坦化されたIterable(Iterable[T])
     """
-    return chain(*matrix)
+    return chain.from_iterable(matrix)
 
 
 def flatten_eager(matrix: Iterable[Iterable[T]]) -> Sequence[T]:
@@ -250,4 +275,4 @@ def flatten_eager(matrix: Iterable[Iterable[T]]) -> Sequence[T]:
     Returns:
         要素を評価して平坦化されたSequence(Sequence[T])
     """
-    return list(chain(*[list(column for column in row) for row in matrix]))
+    return list(chain.from_iterable(matrix))
@@ -3,23 +3,28 @@ MongoDB/AWS DocumentDB登録のための観測所マスター情報
 """
 from __future__ import annotations
 
-import copy
 import dataclasses
-import inspect
+import functools
+import queue
+import threading
+import time
 import urllib.parse
 from datetime import datetime, timezone
 from logging import Logger, getLogger, NullHandler
 from pathlib import Path
-from typing import Optional, Any, Sequence, Mapping, MutableMapping, Union
+from typing import Optional, Any, Sequence, Mapping, MutableMapping, MutableSequence, Union, Final, Generator
 
-from pymongo import MongoClient
-from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError, ServerSelectionTimeoutError
+from pymongo.write_concern import WriteConcern
 
-from Fundamental import InsertError, DBError, JST, DataReadError
+from Fundamental import Error, InsertError, DBError, JST, DataReadError, split_sequence
 
 logger: Logger = getLogger(__name__)
 logger.addHandler(NullHandler())
 
+BULK_WRITE_BATCH_SIZE: Final[int] = 1000  # bulk_writeの1バッチの最大オペレーション数（16MBコマンド上限対策）
+
 
 @dataclasses.dataclass(frozen=True)
 class MongoDBConfig:
@@ -34,6 +39,9 @@ class MongoDBConfig:
     ca_file: Optional[Path] = None  # CAファイルパス
     replica_set: Optional[str] = None  # レプリカセット
     read_preference: Optional[str] = None  # 読み取り負荷分散オプション
+    compressors: Optional[str] = "zlib"  # ワイヤ圧縮方式（カンマ区切り・優先順。サーバと交渉して決まる。
+    # zstd/snappyは追加ライブラリ(zstandard/python-snappy)導入時のみ指定可）
+    zlib_compression_level: int = 3  # zlib使用時の圧縮レベル
     port: int = 27017  # ポート
 
     def __post_init__(self):
@@ -41,12 +49,12 @@ class MongoDBConfig:
             if not self.ca_file.is_file():
                 raise DataReadError(f"The specified SSL CA file {str(self.ca_file)} is not found."
                                     f" Please bring it there."
-                                    f" ({inspect.currentframe().f_code.co_name} in module {__name__}).")
+                                    f" ({MongoDBConfig.__post_init__.__qualname__} in module {__name__}).")
 
-    @property
+    @functools.cached_property
     def uri(self) -> str:
         """
-        MongoDB URI
+        MongoDB URI。frozenなので初回アクセス時に計算してキャッシュする。
         Returns:
             URI(str)
         """
@@ -54,10 +62,10 @@ class MongoDBConfig:
         password: str = urllib.parse.quote_plus(self.password)
         return f'mongodb://{username}:{password}@{self.host}:{self.port}/{self.database}'
 
-    @property
+    @functools.cached_property
     def pymongo_option_dict(self) -> Mapping[str, Any]:
         """
-        Pymongoのオプション辞書
+        Pymongoのオプション辞書。frozenなので初回アクセス時に計算してキャッシュする。
         Returns:
             オプション辞書(Mapping[str, Any])
         """
@@ -69,6 +77,10 @@ class MongoDBConfig:
             option_dict["replicaset"] = self.replica_set
         if self.read_preference is not None:
             option_dict["read_preference"] = self.read_preference
+        if self.compressors is not None:
+            option_dict["compressors"] = self.compressors
+            if "zlib" in self.compressors:
+                option_dict["zlibCompressionLevel"] = self.zlib_compression_level
         return option_dict
 
 
@@ -94,7 +106,7 @@ def make_mongodb_config(
     except KeyError as e:
         raise DataReadError(f"The database setting does not have enough items."
                             f" Please check the 'database' dictionary in a setting file."
-                            f" ({inspect.currentframe().f_code.co_name} in module {__name__},"
+                            f" ({make_mongodb_config.__qualname__} in module {__name__},"
                             f" message: {e.args}).")
 
 
@@ -105,8 +117,11 @@ class MongoDB:
     Attributes:
         __client (pymongo.MongoClient): MongoDBのデータベース
         __collection (pymongo.Collection): MongoDBのデータベース内コレクション
+        __collection_fast (pymongo.Collection): 書き込み確認なし(w=0)のコレクションハンドル
+        __write_collection (pymongo.Collection): 一括書き込みに使うコレクションハンドル
+        __bypass_validation (bool): 一括書き込みでドキュメント検証をスキップするかどうか
     """
-    def __init__(self, config: MongoDBConfig):
+    def __init__(self, config: MongoDBConfig, fast_insert: bool = False, bypass_validation: bool = False):
         """
         設定辞書データ(たいていconfig.json)のDB設定を読み込み、DBへの接続準備をする。
 
@@ -114,13 +129,33 @@ class MongoDB:
             config: 辞書データ。
                     "ca_file", "host", "port", "user_name", "password", "database","collection"
                     のフィールドを持つ。
+            fast_insert(bool): Trueなら一括書き込みを書き込み確認なし(w=0)で行う
+            bypass_validation(bool): Trueなら一括書き込みでサーバ側のドキュメント検証をスキップする。
+                                     bypassDocumentValidation権限が必要。
+                                     書き込み確認なし(w=0)とは併用できないため、fast_insert時は無視される。
         """
         try:
-            with MongoClient(config.uri, **config.pymongo_option_dict) as self.__client:
-                self.__collection = self.__client[config.database].get_collection(config.collection)
+            self.__client = MongoClient(config.uri, **config.pymongo_option_dict)
+            self.__collection = self.__client[config.database].get_collection(config.collection)
+            self.__collection_fast = self.__client[config.database].get_collection(
+                config.collection, write_concern=WriteConcern(w=0))
+            self.__write_collection = self.__collection_fast if fast_insert else self.__collection
+            self.__bypass_validation = bypass_validation and not fast_insert
         except ServerSelectionTimeoutError as e:
             raise DBError(e.args)
 
+    def close(self) -> None:
+        """
+        DB接続（コネクションプール）を閉じる。
+        """
+        self.__client.close()
+
+    def __enter__(self) -> MongoDB:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
     @property
     def all_documents(self) -> Sequence[Mapping[str, Any]]:
         """
@@ -130,8 +165,25 @@ class MongoDB:
              ドキュメントのリスト。
 
         """
+        return list(self.iter_documents())
+
+    def iter_documents(
+            self,
+            field: Optional[Mapping[str, Any]] = None,
+            batch_size: int = 1000
+    ) -> Generator[Mapping[str, Any], Any, None]:
+        """
+        条件に合うドキュメントを、全件メモリに載せずにバッチ単位でストリーミング取得する。
+
+        Args:
+            field(Optional[Mapping[str, Any]]): 取得すべきフィールドのキー。Noneなら全件。
+            batch_size(int): 1回のサーバ往復で取得するドキュメント数
+
+        Returns:
+            ドキュメントのGenerator
+        """
         try:
-            return list(self.__collection.find())
+            yield from self.__collection.find(field if field is not None else {}).batch_size(batch_size)
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -144,11 +196,7 @@ class MongoDB:
             コレクションの最初のドキュメント(Optional[Mapping[str, Any]])
         """
         try:
-            found: Sequence[Any] = list(self.__collection.find_one())
-            if len(found) > 0:
-                return next(iter(found))
-            else:
-                return None
+            return self.__collection.find_one()
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -160,13 +208,9 @@ class MongoDB:
             document(Mapping[str, Any]): 書き込みたいドキュメント
         """
         try:
-            doc_id = identity(document)
-            if len(self.select(doc_id)) == 0:
-                result = self.__collection.insert_one(document)
-            else:
-                result = self.__collection.replace_one(doc_id, document)
+            result = self.__collection.replace_one(identity(document), document, upsert=True)
             if not result.acknowledged:
-                raise InsertError(f"write failed for {result.inserted_id}")
+                raise InsertError(f"write failed for {document['_id']}")
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -177,11 +221,12 @@ class MongoDB:
             documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
         """
         try:
+            now: datetime = datetime.now(tz=JST)
             documents_with_create_time: Sequence[MutableMapping[str, Any]] = [
-                dict(copy.deepcopy(document)) for document in documents]
-            for document in documents_with_create_time:
-                document["createTime"] = datetime.now(tz=JST)
-            self.__collection.insert_many(documents_with_create_time)
+                {**document, "createTime": now} for document in documents]
+            self.__write_collection.insert_many(
+                documents_with_create_time, ordered=False,
+                bypass_document_validation=self.__bypass_validation)
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -192,13 +237,17 @@ class MongoDB:
             documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
         """
         try:
-            for document in documents:
-                for station_id, station_data in document["data"].items():
-                    self.__collection.update_one(
-                        {r"_id": document["_id"]},
-                        {r"$set": {f"data.{station_id}": station_data},
-                         r"$setOnInsert": {"createTime": datetime.now(timezone.utc)}},
-                        upsert=True)
+            # $setOnInsert辞書はバッチ内で共有する（PyMongoは送信時にシリアライズするだけなので安全）
+            set_on_insert: Mapping[str, Any] = {"createTime": datetime.now(timezone.utc)}
+            operations: Sequence[UpdateOne] = [
+                UpdateOne(
+                    identity(document),
+                    {r"$set": {f"data.{station_id}": station_data},
+                     r"$setOnInsert": set_on_insert},
+                    upsert=True)
+                for document in documents
+                for station_id, station_data in document["data"].items()]
+            self.__write_operations(operations)
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -209,12 +258,15 @@ class MongoDB:
             documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
         """
         try:
-            for document in documents:
-                self.__collection.update_one(
-                    {r"_id": document["_id"]},
+            set_on_insert: Mapping[str, Any] = {"createTime": datetime.now(timezone.utc)}
+            operations: Sequence[UpdateOne] = [
+                UpdateOne(
+                    identity(document),
                     {r"$set": document,
-                     r"$setOnInsert": {"createTime": datetime.now(timezone.utc)}},
+                     r"$setOnInsert": set_on_insert},
                     upsert=True)
+                for document in documents]
+            self.__write_operations(operations)
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -225,21 +277,56 @@ class MongoDB:
             documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
         """
         try:
-            for document in documents:
-                self.__collection.update_one(
-                    {r"_id": document["_id"]},
-                    {r"$set": {f"data": document["data"]},
-                     r"$setOnInsert": {"createTime": datetime.now(timezone.utc)}},
+            set_on_insert: Mapping[str, Any] = {"createTime": datetime.now(timezone.utc)}
+            operations: Sequence[UpdateOne] = [
+                UpdateOne(
+                    identity(document),
+                    {r"$set": {r"data": document["data"]},
+                     r"$setOnInsert": set_on_insert},
                     upsert=True)
+                for document in documents]
+            self.__write_operations(operations)
         except OperationFailure as e:
             raise DBError(e.args)
 
+    def bulk_write(self, operations: Sequence[UpdateOne]) -> None:
+        """
+        書き込みオペレーション列を一括実行する。
+        Args:
+            operations(Sequence[pymongo.UpdateOne]): 書き込みオペレーション列
+        """
+        try:
+            self.__write_operations(operations)
+        except OperationFailure as e:
+            raise DBError(e.args)
+
+    def __write_operations(self, operations: Sequence[UpdateOne]) -> None:
+        """
+        書き込みオペレーション列をバッチに分割してbulk_writeで一括実行
+        Args:
+            operations(Sequence[pymongo.UpdateOne]): 書き込みオペレーション列
+        """
+        for operation_batch in split_sequence(operations, BULK_WRITE_BATCH_SIZE):
+            self.__write_collection.bulk_write(
+                list(operation_batch), ordered=False,
+                bypass_document_validation=self.__bypass_validation)
+
     def remove_all(self):
         """
         コレクションのドキュメントを全て削除
         """
         try:
-            self.__collection.remove()
+            self.__collection.delete_many({})
+        except OperationFailure as e:
+            raise DBError(e.args)
+
+    def truncate(self) -> None:
+        """
+        コレクションごと削除する。ドキュメント単位のdeleteより大幅に速い。
+        次の書き込みでコレクションは再作成される。
+        """
+        try:
+            self.__collection.drop()
         except OperationFailure as e:
             raise DBError(e.args)
 
@@ -249,7 +336,7 @@ class MongoDB:
         Args:
             documents(Sequence[Mapping[str, Any]]):  書き込みたいドキュメント列
         """
-        self.remove_all()
+        self.truncate()
         self.insert_all(documents)
 
     def update(self, update_field: Mapping[str, Any]) -> None:
@@ -284,10 +371,103 @@ class MongoDB:
         Returns:
             取得したドキュメントのリスト
         """
+        return list(self.iter_documents(field))
+
+
+class AsyncMongoWriter:
+    """
+    MongoDBへの書き込みを呼び出し元スレッドから切り離す非同期ライタ
+
+    submitされたドキュメントをキューに積み、バックグラウンドスレッドが
+    バッチサイズ到達またはフラッシュ間隔経過のたびにまとめてupsertする。
+
+    Attributes:
+        __mongo (MongoDB): 書き込み先DB
+        __batch_size (int): 一括書き込みするドキュメント数
+        __flush_interval (float): フラッシュ間隔（秒）
+        __queue (queue.Queue): 書き込み待ちドキュメントのキュー
+        __closed (threading.Event): クローズ要求フラグ
+        __thread (threading.Thread): 書き込みスレッド
+    """
+    def __init__(self, mongo: MongoDB, batch_size: int = 1000, flush_ms: int = 50):
+        """
+        書き込みスレッドを起動する。
+
+        Args:
+            mongo(MongoDB): 書き込み先DB
+            batch_size(int): 一括書き込みするドキュメント数
+            flush_ms(int): フラッシュ間隔（ミリ秒）
+        """
+        self.__mongo: MongoDB = mongo
+        self.__batch_size: int = batch_size
+        self.__flush_interval: float = flush_ms / 1000.0
+        self.__queue: queue.Queue = queue.Queue()
+        self.__closed: threading.Event = threading.Event()
+        self.__thread: threading.Thread = threading.Thread(target=self.__drain_loop, daemon=True)
+        self.__thread.start()
+
+    def submit(self, document: Mapping[str, Any]) -> None:
+        """
+        ドキュメントを書き込みキューに積む（ブロックしない）。
+
+        Args:
+            document(Mapping[str, Any]): 書き込みたいドキュメント
+        """
+        self.__queue.put(document)
+
+    def close(self) -> None:
+        """
+        キューに残ったドキュメントを書き切ってから書き込みスレッドを終了する。
+        """
+        self.__closed.set()
+        self.__thread.join()
+
+    def __enter__(self) -> AsyncMongoWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __drain_loop(self) -> None:
+        """
+        書き込みスレッドのメインループ。キューからドキュメントを取り出し、
+        バッチサイズ到達またはフラッシュ間隔経過でまとめてupsertする。
+        """
+        buffered_documents: MutableSequence[Mapping[str, Any]] = []
+        next_flush_time: float = time.monotonic() + self.__flush_interval
+        while not (self.__closed.is_set() and self.__queue.empty() and len(buffered_documents) == 0):
+            try:
+                buffered_documents.append(
+                    self.__queue.get(timeout=max(next_flush_time - time.monotonic(), 0.0)))
+            except queue.Empty:
+                pass
+            if len(buffered_documents) >= self.__batch_size or time.monotonic() >= next_flush_time:
+                if len(buffered_documents) > 0:
+                    self.__flush(buffered_documents)
+                    buffered_documents = []
+                next_flush_time = time.monotonic() + self.__flush_interval
+
+    def __flush(self, documents: Sequence[Mapping[str, Any]]) -> None:
+        """
+        バッファ内のドキュメントをupsertで一括書き込みする。
+
+        Args:
+            documents(Sequence[Mapping[str, Any]]): 書き込みたいドキュメント列
+        """
+        set_on_insert: Mapping[str, Any] = {"createTime": datetime.now(timezone.utc)}
+        operations: Sequence[UpdateOne] = [
+            UpdateOne(
+                identity(document),
+                {r"$set": document,
+                 r"$setOnInsert": set_on_insert},
+                upsert=True)
+            for document in documents]
         try:
-            return list(self.__collection.find(field))
-        except OperationFailure as e:
-            raise DBError(e.args)
+            self.__mongo.bulk_write(operations)
+        except (OSError, Error, PyMongoError) as e:
+            # 書き込みスレッドを殺すと以後のsubmitが黙って失われるため、
+            # 接続断などの一過性の失敗もここで握ってログに残すだけにする
+            logger.error("%s", e.args)
 
 
 def identity(input_document: Mapping[str, Any]) -> Union[Mapping[str, Any], Any]:
@@ -5,7 +5,10 @@ from __future__ import annotations
 
 import sys
 from logging import Logger, getLogger, NullHandler
-from typing import Sequence, Mapping, Any
+from typing import Sequence, Mapping, Any, Final
+
+from bson import encode
+from bson.raw_bson import RawBSONDocument
 
 from Fundamental import Error
 from MongoDb import MongoDB, make_mongodb_config
@@ -13,6 +16,8 @@ from MongoDb import MongoDB, make_mongodb_config
 logger: Logger = getLogger(__name__)
 logger.addHandler(NullHandler())
 
+DOCUMENT_ID_BASE: Final[int] = 202107041000  # テストドキュメントの"_id"の基準値
+
 
 def main() -> None:
     """
@@ -22,20 +27,26 @@ def main() -> None:
         mongo_db: MongoDB = MongoDB(make_mongodb_config("TEST_LOCAL", "test_collection1"))
         mongo_db.remove_all()
 
+        # 全ドキュメント共通のペイロードは1回だけBSONに事前エンコードし、
+        # 書き込みごとのpymongoの再エンコードを省く
+        station_data: RawBSONDocument = RawBSONDocument(
+            encode({f"station_{j}": str(float(j)) for j in range(10)}))
         documents: Sequence[Mapping[str, Any]] = [{
-            "_id": 202107041000 + i,
-            "data": {f"station_{j}": str(float(j)) for j in range(10)}
+            "_id": DOCUMENT_ID_BASE + i,
+            "data": station_data
         } for i in range(5)]
         mongo_db.upsert_all(documents)
 
+        station_data2: RawBSONDocument = RawBSONDocument(
+            encode({f"station_{j}": str(float(j)+10.0) for j in range(7)}))
         documents2: Sequence[Mapping[str, Any]] = [{
-            "_id": 202107041000 + i,
-            "data": {f"station_{j}": str(float(j)+10.0) for j in range(7)}
+            "_id": DOCUMENT_ID_BASE + i,
+            "data": station_data2
         } for i in range(5)]
         mongo_db.upsert_each(documents2)
 
     except (OSError, Error) as e:
-        logger.error(e.args)
+        logger.error("%s", e.args)
         sys.exit(1)
 
 